@@ -3,8 +3,14 @@ import subprocess
 from pathlib import Path
 import argparse
 import re
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
+import functools
+
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
 
 # Configure logging
 logging.basicConfig(
@@ -12,10 +18,60 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
     handlers=[logging.StreamHandler()]
 )
+logger = logging.getLogger(__name__)
+
+# Snapshot of the environment, copied for git commands that need extra variables
+_BASE_ENV = dict(os.environ)
+
+# Errors raised by git, whether run as a subprocess or in-process through pygit2
+_GIT_ERRORS = (subprocess.CalledProcessError,)
+if pygit2 is not None:
+    _GIT_ERRORS += (pygit2.GitError, pygit2.AlreadyExistsError)
+
+# Patterns used to parse the branch name, changelog and commit message
+_BRANCH_RE = re.compile(r"(?P<customer_name>\w+)/release")
+_VERSION_RE = re.compile(r"^## v(?P<version>\d+\.\d+\.\d+)", re.MULTILINE)
+_SEMVER_RE = re.compile(r"(\d+)\.(\d+)\.(\d+)")
+_COMMIT_RE = re.compile(r"[A-z]+-\d+-(?P<bump_type>\w+)")
+
+@functools.lru_cache(maxsize=None)
+def _git(repo_path, *args):
+    """Run a read-only git command in the repository and return its output (cached per argv)."""
+    result = subprocess.run(
+        ["git", "-C", repo_path, *args],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return result.stdout.decode("utf-8")
+
+
+def _read_current_branch(repo_path):
+    """Read the current branch name from .git/HEAD, falling back to git when it is not a plain checkout."""
+    head_file = repo_path / ".git" / "HEAD"
+    head = head_file.read_text().strip() if "GIT_DIR" not in os.environ and head_file.is_file() else ""
+    if not head or head == "ref: refs/heads/.invalid":
+        # GIT_DIR, worktrees, submodules, subdirectories and reftable repos (whose HEAD
+        # file is a '.invalid' stub) need git to resolve the branch
+        return _git(str(repo_path), "branch", "--show-current").strip()
+    if not head.startswith("ref: refs/heads/"):
+        # Detached HEAD, matching `git branch --show-current`
+        return ""
+    return head.removeprefix("ref: refs/heads/")
+
+
+def _read_head_commit(repo_path):
+    """Read the HEAD commit and return its (message, author name, author email)."""
+    # git re-encodes the fields to UTF-8 when the commit has an `encoding` header
+    output = _git(str(repo_path), "log", "-1", "--format=%an%x00%ae%x00%B")
+    author_name, author_email, message = output.split("\0", 2)
+    return message.strip(), author_name, author_email
+
 
 def parse_arguments():
     """Parse command-line arguments."""
-    logging.info("Parsing command-line arguments.")
+    logger.info("Parsing command-line arguments.")
     parser = argparse.ArgumentParser(description="Config release script.")
     parser.add_argument(
         "--repo-path",
@@ -23,182 +79,230 @@ def parse_arguments():
         default=Path.cwd(),
         help="Path to the repository (default: current working directory).",
     )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Amend and tag through pygit2 instead of spawning git, when it is installed and "
+        "no commit hooks or commit signing are configured (default: off).",
+    )
     return parser.parse_args()
 
 
 def parse_customer_name(repo_path):
     """Parse the customer from the branch name."""
-    logging.info("Parsing customer from branch name.")
-    BRANCH_PATTERN = r"(?P<customer_name>\w+)/release"
-
+    logger.info("Parsing customer from branch name.")
     try:
         # Get the current branch name
-        result = subprocess.run(
-            ["git", "-C", str(repo_path), "branch", "--show-current"],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        branch_name = result.stdout.strip()
-        match = re.search(BRANCH_PATTERN, branch_name)
-        if not match:
-            raise ValueError("Branch name does not match the expected pattern. Expected: '<customer_name>/release', got: {branch_name}")
-
-        customer_name = match.group("customer_name")
-        logging.info(f"Extracted metadata: Customer Name = {customer_name}")
+        branch_name = _read_current_branch(repo_path)
+        customer_name, _, suffix = branch_name.partition("/")
+        # Fast path for the plain '<customer_name>/release' shape; anything else goes through the regex
+        if suffix != "release" or not customer_name or not all(c.isalnum() or c == "_" for c in customer_name):
+            match = _BRANCH_RE.search(branch_name)
+            if not match:
+                raise ValueError(f"Branch name does not match the expected pattern. Expected: '<customer_name>/release', got: {branch_name}")
+            customer_name = match.group("customer_name")
+
+        logger.info("Extracted metadata: Customer Name = %s", customer_name)
         return customer_name
     except Exception as e:
-        logging.error(f"Error parsing customer name: {e}")
+        logger.error("Error parsing customer name: %s", e)
         raise
 
 
+def _find_last_version(path, chunk_size=8192):
+    """Return the version of the last header in a file, scanning chunks from the end."""
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b""
+        while position > 0:
+            read_size = min(chunk_size, position)
+            position -= read_size
+            f.seek(position)
+            text = f.read(read_size) + remainder
+            if position > 0:
+                # The first piece may be the tail of a line that starts in an earlier chunk
+                remainder, _, text = text.partition(b"\n")
+            match = None
+            for match in _VERSION_RE.finditer(text.decode("utf-8")):
+                pass
+            if match:
+                return match.group("version")
+    return None
+
+
 def read_latest_version(changelog_file):
     """Read the latest version from the changelog."""
-    logging.info("Reading the latest version from CHANGELOG.md.")
-    VERSION_PATTERN = r"## v(?P<version>\d+\.\d+\.\d+)"
+    logger.info("Reading the latest version from CHANGELOG.md.")
     INIT_VERSION = "0.0.0"
 
     if not changelog_file.exists():
-        logging.info("CHANGELOG.md not found. Creating a new one...")
-        with open(changelog_file, "w") as f:
-            f.write("# Changelog\n\n")
+        logger.info("CHANGELOG.md not found. Creating a new one...")
+        changelog_file.write_text("# Changelog\n\n")
 
-    with open(changelog_file, "r") as f:
-        lines = f.readlines()
-
-    version = INIT_VERSION
-    for line in lines:
-        match = re.match(VERSION_PATTERN, line)
-        if match:
-            version = match.group("version")
+    # Entries are appended, so the latest version is the last header in the file
+    version = _find_last_version(changelog_file) or INIT_VERSION
 
     if version != INIT_VERSION:
-        logging.info(f"Latest version found: {version}")
+        logger.info("Latest version found: %s", version)
     else:
-        logging.warning("No version found in CHANGELOG.md. Defaulting to '0.0.0'.")
+        logger.warning("No version found in CHANGELOG.md. Defaulting to '0.0.0'.")
     return version
 
 
 def bump_version(version, bump_type):
     """Increment the version based on the bump type."""
-    logging.info(f"Bumping version {version} with bump type '{bump_type}'.")
-    major, minor, patch = map(int, version.split("."))
-    if bump_type == "major":
-        major += 1
-        minor = 0
-        patch = 0
-    elif bump_type == "minor":
-        minor += 1
-        patch = 0
-    elif bump_type == "bugfix":
-        patch += 1
-    else:
-        logging.error(f"Invalid bump type: {bump_type}")
-        raise ValueError(f"Unknown bump type: {bump_type}")
+    logger.info("Bumping version %s with bump type '%s'.", version, bump_type)
+    semver = _SEMVER_RE.fullmatch(version)
+    if not semver:
+        logger.error("Invalid version: %s", version)
+        raise ValueError(f"Invalid version: expected 'MAJOR.MINOR.PATCH', got: {version}")
+    major, minor, patch = int(semver[1]), int(semver[2]), int(semver[3])
+    match bump_type:
+        case "major":
+            major += 1
+            minor = 0
+            patch = 0
+        case "minor":
+            minor += 1
+            patch = 0
+        case "bugfix":
+            patch += 1
+        case _:
+            logger.error("Invalid bump type: %s", bump_type)
+            raise ValueError(f"Unknown bump type: {bump_type}")
     new_version = f"{major}.{minor}.{patch}"
-    logging.info(f"New version calculated: {new_version}")
+    logger.info("New version calculated: %s", new_version)
     return new_version
 
 
-def analyze_last_commit(repo_path):
-    """Analyze the last commit message to determine the version bump type."""
-    COMMIT_PATTERN = r"[A-z]+-\d+-(?P<bump_type>\w+)"
-
-    logging.info("Analyzing the last commit to determine the version bump type.")
+def fetch_last_commit_message(repo_path):
+    """Fetch the message of the last commit."""
+    logger.info("Fetching the last commit message.")
     try:
-        result = subprocess.run(
-            ["git", "-C", str(repo_path), "log", "--pretty=%B", "-1"],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        commit_message = result.stdout.strip()
-        bump_type = "bugfix"
-        match = re.match(COMMIT_PATTERN, commit_message)
-        if match:
-            bump_type = match.group("bump_type").lower()
-        else:
-            raise ValueError(f"Invalid commit message format: missing bump type (Major/Minor/Bugfix). Got: {commit_message}")
-        logging.info(f"Bump type determined: {bump_type}")
-        return bump_type
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error analyzing commits: {e}")
+        message, _, _ = _read_head_commit(repo_path)
+        return message
+    except (subprocess.CalledProcessError, ValueError) as e:
+        logger.error("Error fetching the last commit message: %s", e)
         raise
 
 
-def generate_changelog(repo_path, changelog_file, new_version):
-    """Generate a changelog from recent commits."""
-    logging.info(f"Generating changelog for version {new_version}.")
-    timestamp = datetime.now().strftime("%b %d, %Y, %I:%M:%S %p")
+def analyze_last_commit(commit_message):
+    """Analyze the last commit message to determine the version bump type."""
+    logger.info("Analyzing the last commit to determine the version bump type.")
+    bump_type = "bugfix"
+    match = _COMMIT_RE.match(commit_message)
+    if match:
+        bump_type = match.group("bump_type").lower()
+    else:
+        raise ValueError(f"Invalid commit message format: missing bump type (Major/Minor/Bugfix). Got: {commit_message}")
+    logger.info("Bump type determined: %s", bump_type)
+    return bump_type
+
+
+def generate_changelog(changelog_file, new_version, change_description, timestamp):
+    """Generate a changelog entry from the last commit message."""
+    logger.info("Generating changelog for version %s.", new_version)
     try:
-        result = subprocess.run(
-            ["git", "-C", str(repo_path), "log", "--pretty=format:%B", "-1"],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        change_description = result.stdout.strip()
         with open(changelog_file, "a") as f:
-            f.write(f"## v{new_version} - {timestamp} (UTC)\n")
-            f.write(change_description)
-            f.write("\n\n")
-        logging.info("Changelog updated successfully.")
+            f.write(f"## v{new_version} - {timestamp} (UTC)\n{change_description}\n\n")
+        logger.info("Changelog updated successfully.")
     except Exception as e:
-        logging.error(f"Error generating changelog: {e}")
+        logger.error("Error generating changelog: %s", e)
         raise
 
 
-def amend_commit_with_changelog(repo_path, changelog_file):
-    """Amend the last commit to include the updated changelog."""
-    try:
-        # Stage the updated changelog file
-        subprocess.run(["git", "-C", str(repo_path), "add", str(changelog_file)], check=True)
+# Hooks that `git commit --amend` and `git tag` would run; pygit2 runs none of them
+_COMMIT_HOOKS = (
+    "pre-commit",
+    "prepare-commit-msg",
+    "commit-msg",
+    "post-commit",
+    "post-rewrite",
+    "reference-transaction",
+)
+
 
+def _open_in_process_repo(repo_path):
+    """Open the repository with pygit2, or return None when the amend and tag must go through git."""
+    if pygit2 is None:
+        logger.warning("pygit2 is not installed. Falling back to git subprocesses.")
+        return None
+    repo = pygit2.Repository(str(repo_path))
+    if "commit.gpgSign" in repo.config and repo.config.get_bool("commit.gpgSign"):
+        logger.info("Commit signing is enabled. Falling back to git subprocesses.")
+        return None
+    if "core.hooksPath" in repo.config:
+        hooks_dir = Path(repo.config["core.hooksPath"]).expanduser()
+        if not hooks_dir.is_absolute():
+            hooks_dir = Path(repo.workdir) / hooks_dir
+    else:
+        hooks_dir = Path(repo.path) / "hooks"
+    if any((hooks_dir / hook).is_file() for hook in _COMMIT_HOOKS):
+        logger.info("Commit hooks are configured. Falling back to git subprocesses.")
+        return None
+    return repo
+
+
+def _amend_commit_in_process(repo, changelog_file, commit_message, committer_name, committer_email):
+    """Stage the changelog and amend HEAD through pygit2, without spawning git."""
+    workdir = Path(repo.workdir).resolve()
+    repo.index.add(Path(changelog_file).resolve().relative_to(workdir).as_posix())
+    repo.index.write()
+    tree = repo.index.write_tree()
+    committer = pygit2.Signature(committer_name, committer_email)
+    commit_id = repo.amend_commit(repo.head.peel(pygit2.Commit), None, committer=committer, tree=tree)
+    # Move the branch ourselves so the reflog records an amend, as `git commit --amend` does
+    subject = commit_message.splitlines()[0] if commit_message else ""
+    repo.head.set_target(commit_id, f"commit (amend): {subject}")
+
+
+def amend_commit_with_changelog(repo_path, changelog_file, repo=None):
+    """Amend the last commit to include the updated changelog (in-process when a pygit2 repo is given)."""
+    try:
         # Get the original committer name and email
-        committer_name = subprocess.run(
-            ["git", "-C", str(repo_path), "log", "-1", "--pretty=format:%an"],
-            capture_output=True,
-            text=True,
-            check=True,
-        ).stdout.strip()
-
-        committer_email = subprocess.run(
-            ["git", "-C", str(repo_path), "log", "-1", "--pretty=format:%ae"],
-            capture_output=True,
-            text=True,
-            check=True,
-        ).stdout.strip()
-
-        # Amend the commit using the original committer identity
-        subprocess.run(
-            ["git", "-C", str(repo_path), "commit", "--amend", "--no-edit"],
-            check=True,
-            env={
-                **os.environ,
-                "GIT_COMMITTER_NAME": committer_name,
-                "GIT_COMMITTER_EMAIL": committer_email,
-            },
-        )
-        logging.info("Changelog added to the last commit successfully.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error amending the commit: {e}")
+        commit_message, committer_name, committer_email = _read_head_commit(repo_path)
+
+        if repo is not None:
+            _amend_commit_in_process(repo, changelog_file, commit_message, committer_name, committer_email)
+        else:
+            # Stage the updated changelog file
+            subprocess.run(["git", "-C", str(repo_path), "add", str(changelog_file)], stdin=subprocess.DEVNULL, check=True)
+
+            # Amend the commit using the original committer identity
+            env = _BASE_ENV.copy()
+            env["GIT_COMMITTER_NAME"] = committer_name
+            env["GIT_COMMITTER_EMAIL"] = committer_email
+            subprocess.run(
+                ["git", "-C", str(repo_path), "commit", "--amend", "--no-edit"],
+                stdin=subprocess.DEVNULL,
+                check=True,
+                env=env,
+            )
+        # HEAD has moved, so cached read-only results are stale
+        _git.cache_clear()
+        logger.info("Changelog added to the last commit successfully.")
+    except _GIT_ERRORS as e:
+        logger.error("Error amending the commit: %s", e)
         raise
 
 
-def tag_version(repo_path, prefix, new_version):
-    """Tag the repository with the new version."""
-    logging.info(f"Tagging repository with version {new_version} (prefix: {prefix}).")
+def tag_version(repo_path, prefix, new_version, repo=None):
+    """Tag the repository with the new version (in-process when a pygit2 repo is given)."""
+    logger.info("Tagging repository with version %s (prefix: %s).", new_version, prefix)
     tag_name = f"{prefix}/v{new_version}"
     try:
-        subprocess.run(["git", "-C", str(repo_path), "tag", tag_name], check=True)
-        logging.info(f"Tag {tag_name} created successfully.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error creating tag: {e}")
+        if repo is not None:
+            repo.references.create(f"refs/tags/{tag_name}", repo.head.target)
+        else:
+            subprocess.run(["git", "-C", str(repo_path), "tag", tag_name], stdin=subprocess.DEVNULL, check=True)
+        logger.info("Tag %s created successfully.", tag_name)
+    except _GIT_ERRORS as e:
+        logger.error("Error creating tag: %s", e)
         raise
 
 
 def main():
-    logging.info("Starting the Config Release Script.")
+    logger.info("Starting the Config Release Script.")
     args = parse_arguments()
     repo_path = args.repo_path
     changelog_file = repo_path / "CHANGELOG.md"
@@ -210,22 +314,29 @@ def main():
     # Determine the current version from the changelog
     current_version = read_latest_version(changelog_file)
 
+    # Fetch the last commit message once; it drives both the bump and the changelog
+    commit_message = fetch_last_commit_message(repo_path)
+
     # Determine the type of version bump based on commits
-    bump_type = analyze_last_commit(repo_path)
+    bump_type = analyze_last_commit(commit_message)
 
     # Calculate the new version
     new_version = bump_version(current_version, bump_type)
 
     # Update the changelog with the new version
-    generate_changelog(repo_path, changelog_file, new_version)
+    timestamp = datetime.now(timezone.utc).strftime("%b %d, %Y, %I:%M:%S %p")
+    generate_changelog(changelog_file, new_version, commit_message, timestamp)
+
+    # Decide once whether both the amend and the tag can skip spawning git
+    repo = _open_in_process_repo(repo_path) if args.in_process else None
 
     # Amend the last commit to include the updated changelog
-    amend_commit_with_changelog(repo_path, changelog_file)
+    amend_commit_with_changelog(repo_path, changelog_file, repo)
 
     # Tag the repository
-    tag_version(repo_path, prefix, new_version)
+    tag_version(repo_path, prefix, new_version, repo)
 
-    logging.info(f"Released version: {prefix}/v{new_version}")
+    logger.info("Released version: %s/v%s", prefix, new_version)
 
 
 if __name__ == "__main__":
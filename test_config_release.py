@@ -0,0 +1,153 @@
+import os
+import subprocess
+
+import pytest
+
+import config_release
+from config_release import (
+    _find_last_version,
+    _open_in_process_repo,
+    _read_current_branch,
+    _read_head_commit,
+    amend_commit_with_changelog,
+    tag_version,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_git_cache():
+    config_release._git.cache_clear()
+    yield
+    config_release._git.cache_clear()
+
+
+def git(repo_path, *args, **kwargs):
+    return subprocess.run(["git", "-C", str(repo_path), *args], capture_output=True, check=True, **kwargs).stdout
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo_path = tmp_path / "repo"
+    git(tmp_path, "init", "-q", "-b", "acme/release", str(repo_path))
+    git(repo_path, "config", "user.name", "Alice A")
+    git(repo_path, "config", "user.email", "alice@example.com")
+    (repo_path / "CHANGELOG.md").write_text("# Changelog\n\n")
+    git(repo_path, "add", "CHANGELOG.md")
+    # A different committer, so the amend visibly restores the author's identity
+    env = {**os.environ, "GIT_COMMITTER_NAME": "CI", "GIT_COMMITTER_EMAIL": "ci@example.com"}
+    git(repo_path, "commit", "-q", "-m", "ABC-1-Minor: add thing", env=env)
+    return repo_path
+
+
+@pytest.fixture
+def pygit2():
+    return pytest.importorskip("pygit2")
+
+
+def test_find_last_version_header_straddles_chunk_boundary(tmp_path):
+    changelog_file = tmp_path / "CHANGELOG.md"
+    changelog_file.write_text("# Changelog\n\n## v1.0.0 - old\nold\n\n## v1.2.3 - new\nnew\n\n")
+    # Chunks of 7 bytes split both headers across reads
+    assert _find_last_version(changelog_file, chunk_size=7) == "1.2.3"
+
+
+def test_find_last_version_multibyte_split_across_chunks(tmp_path):
+    changelog_file = tmp_path / "CHANGELOG.md"
+    changelog_file.write_text("# Changelog\n\n## v2.0.0 - x\nrésumé ünïcödé\n\n", encoding="utf-8")
+    for chunk_size in (1, 2, 3, 5):
+        assert _find_last_version(changelog_file, chunk_size=chunk_size) == "2.0.0"
+
+
+def test_find_last_version_without_header(tmp_path):
+    changelog_file = tmp_path / "CHANGELOG.md"
+    changelog_file.write_text("# Changelog\n\nx## v1.0.0 is not a header\n")
+    assert _find_last_version(changelog_file, chunk_size=4) is None
+
+
+def test_read_head_commit(repo):
+    assert _read_head_commit(repo) == ("ABC-1-Minor: add thing", "Alice A", "alice@example.com")
+
+
+def test_read_head_commit_reencodes_legacy_encoding(repo, tmp_path):
+    message_file = tmp_path / "msg"
+    message_file.write_bytes("ABC-1-Bugfix café".encode("latin-1"))
+    git(repo, "-c", "i18n.commitEncoding=ISO-8859-1", "commit", "-q", "--allow-empty", "-F", str(message_file))
+    assert _read_head_commit(repo)[0] == "ABC-1-Bugfix café"
+
+
+def test_read_current_branch(repo):
+    assert _read_current_branch(repo) == "acme/release"
+
+
+def test_read_current_branch_detached_head(repo):
+    git(repo, "checkout", "-q", "--detach")
+    assert _read_current_branch(repo) == ""
+
+
+def test_read_current_branch_reftable_stub_falls_back_to_git(repo, monkeypatch):
+    (repo / ".git" / "HEAD").write_text("ref: refs/heads/.invalid\n")
+    calls = []
+    monkeypatch.setattr(config_release, "_git", lambda *args: calls.append(args) or "acme/release\n")
+    assert _read_current_branch(repo) == "acme/release"
+    assert calls == [(str(repo), "branch", "--show-current")]
+
+
+def test_read_current_branch_honours_git_dir(repo, tmp_path, monkeypatch):
+    other = tmp_path / "other"
+    other.mkdir()
+    monkeypatch.setenv("GIT_DIR", str(repo / ".git"))
+    assert _read_current_branch(other) == "acme/release"
+
+
+def test_read_current_branch_in_worktree(repo, tmp_path):
+    worktree = tmp_path / "worktree"
+    git(repo, "worktree", "add", "-q", "-b", "beta/release", str(worktree))
+    assert (worktree / ".git").is_file()
+    assert _read_current_branch(worktree) == "beta/release"
+
+
+def test_amend_commit_in_process(repo, pygit2):
+    changelog_file = repo / "CHANGELOG.md"
+    changelog_file.write_text("# Changelog\n\n## v0.1.0 - now (UTC)\nABC-1-Minor: add thing\n\n")
+    amend_commit_with_changelog(repo, changelog_file, pygit2.Repository(str(repo)))
+
+    log = git(repo, "log", "-1", "--format=%an|%ae|%cn|%ce|%B").decode().strip()
+    assert log == "Alice A|alice@example.com|Alice A|alice@example.com|ABC-1-Minor: add thing"
+    assert git(repo, "show", "HEAD:CHANGELOG.md").decode() == changelog_file.read_text()
+    assert git(repo, "rev-list", "--count", "HEAD").decode().strip() == "1"
+    assert git(repo, "reflog", "-1", "--format=%gs").decode().strip() == "commit (amend): ABC-1-Minor: add thing"
+    assert git(repo, "status", "--porcelain").decode() == ""
+
+
+def test_open_in_process_repo(repo, pygit2):
+    assert _open_in_process_repo(repo) is not None
+
+
+def test_open_in_process_repo_falls_back_on_commit_signing(repo, pygit2):
+    git(repo, "config", "commit.gpgSign", "true")
+    assert _open_in_process_repo(repo) is None
+
+
+@pytest.mark.parametrize("hook", config_release._COMMIT_HOOKS)
+def test_open_in_process_repo_falls_back_on_hook(repo, pygit2, hook):
+    (repo / ".git" / "hooks" / hook).write_text("#!/bin/sh\n")
+    assert _open_in_process_repo(repo) is None
+
+
+def test_open_in_process_repo_falls_back_on_hooks_path(repo, pygit2):
+    (repo / "hooks").mkdir()
+    (repo / "hooks" / "pre-commit").write_text("#!/bin/sh\n")
+    git(repo, "config", "core.hooksPath", "hooks")
+    assert _open_in_process_repo(repo) is None
+
+
+def test_tag_version_in_process(repo, pygit2):
+    tag_version(repo, "acme", "0.1.0", pygit2.Repository(str(repo)))
+    assert git(repo, "rev-parse", "acme/v0.1.0") == git(repo, "rev-parse", "HEAD")
+
+
+def test_tag_version_in_process_existing_tag(repo, pygit2, caplog):
+    git(repo, "tag", "acme/v0.1.0")
+    with pytest.raises(pygit2.AlreadyExistsError):
+        tag_version(repo, "acme", "0.1.0", pygit2.Repository(str(repo)))
+    assert "Error creating tag" in caplog.text